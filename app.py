@@ -1,9 +1,19 @@
+import asyncio
+import csv
+import hashlib
+import io
 import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.express as px
+import pyarrow as pa
 from datetime import datetime
-from yahoo_interface import YahooInterface
-from portfolio_ai_analyzer import PortfolioAIAnalyzer
+from yahoo_interface import YahooInterface, OPTION_SYMBOL_PATTERN
+
+# Columns read from the uploaded CSV; any others are ignored
+PORTFOLIO_COLUMNS = ('Symbol', 'Shares', 'Purchase Price')
+
+# Portfolios with fewer slices than this are charted as bars by default
+BAR_CHART_MAX_SLICES = 30
 
 st.set_page_config(
     page_title="Portfolio Analyzer",
@@ -14,14 +24,71 @@ st.set_page_config(
 st.title("📊 Portfolio Analyzer")
 st.markdown("Upload your portfolio CSV file to analyze your investments (stocks and options)")
 
+@st.cache_resource
+def get_yahoo():
+    """Shared YahooInterface, so its caches and HTTP connections survive reruns."""
+    return YahooInterface()
+
+@st.cache_resource
+def get_ai():
+    """Shared PortfolioAIAnalyzer, so its OpenAI client is created once."""
+    # Imported lazily so the landing page does not pay for loading openai
+    from portfolio_ai_analyzer import PortfolioAIAnalyzer
+    return PortfolioAIAnalyzer()
+
 # Initialize interfaces
-yahoo = YahooInterface()
+yahoo = get_yahoo()
 
 # Initialize session state
 if 'portfolio_data' not in st.session_state:
     st.session_state.portfolio_data = None
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
+if 'last_file_hash' not in st.session_state:
+    st.session_state.last_file_hash = None
+if 'portfolio_summary_text' not in st.session_state:
+    st.session_state.portfolio_summary_text = None
+
+@st.cache_data(ttl=300, show_spinner=False)
+def read_portfolio_csv(file_bytes: bytes) -> pd.DataFrame:
+    """Parse uploaded portfolio CSV contents into Arrow-backed columns, memoized on the file bytes."""
+    # The pyarrow engine rejects callable usecols and unknown names, so match against the header
+    header = next(csv.reader(io.TextIOWrapper(io.BytesIO(file_bytes), encoding='utf-8-sig', newline='')), [])
+    usecols = [col for col in header if col in PORTFOLIO_COLUMNS]
+    return pd.read_csv(io.BytesIO(file_bytes), engine='pyarrow', dtype_backend='pyarrow', usecols=usecols or None)
+
+def fetch_prices(symbols: tuple) -> dict:
+    """Fetch prices for all symbols concurrently.
+    
+    Not memoized here: YahooInterface already caches successful prices, and
+    failures should be retried on the next upload rather than pinned.
+    
+    Returns a mapping of symbol to (price, error_message) tuples.
+    """
+    # Advance a progress bar as each symbol's price arrives
+    progress_bar = st.progress(0.0, text=f"🔄 Fetching current prices for {len(symbols)} symbols...")
+    done = 0
+    
+    def on_result(symbol, price, error):
+        nonlocal done
+        done += 1
+        progress_bar.progress(done / len(symbols), text=f"🔄 Fetched {done} of {len(symbols)} prices...")
+    
+    try:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop in this thread, so the asyncio path can own one
+            return asyncio.run(yahoo.fetch_prices_async(symbols, on_result))
+        
+        # An event loop is already running in this thread; use the thread-pool path instead
+        results = {}
+        for symbol, price, error in yahoo.fetch_prices(symbols):
+            results[symbol] = (price, error)
+            on_result(symbol, price, error)
+        return results
+    finally:
+        progress_bar.empty()
 
 # File uploader
 uploaded_file = st.file_uploader(
@@ -30,11 +97,25 @@ uploaded_file = st.file_uploader(
     help="CSV should contain columns: 'Symbol' (stock ticker or option in format 'TICKER MM/DD/YYYY STRIKE C/P'), 'Shares' (number of shares), and optionally 'Purchase Price'"
 )
 
-def process_portfolio(uploaded_file):
-    """Process uploaded portfolio CSV and fetch prices."""
+def show_fetch_errors(errors):
+    """Warn about symbols whose prices could not be fetched."""
+    if errors:
+        st.warning("⚠️ Some symbols could not be fetched:")
+        for error in errors:
+            st.text(f"  • {error}")
+
+def process_portfolio(file_bytes):
+    """Process uploaded portfolio CSV contents and fetch prices."""
+    # Skip the whole pipeline when the same file was already processed,
+    # but keep showing the fetch warnings from that run
+    file_hash = hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+    if file_hash == st.session_state.last_file_hash and st.session_state.portfolio_data:
+        show_fetch_errors(st.session_state.portfolio_data['errors'])
+        return st.session_state.portfolio_data
+    
     try:
         # Read CSV file
-        df = pd.read_csv(uploaded_file)
+        df = read_portfolio_csv(file_bytes)
         
         # Validate required columns
         required_columns = ['Symbol', 'Shares']
@@ -45,68 +126,79 @@ def process_portfolio(uploaded_file):
             st.info("Please ensure your CSV has 'Symbol' and 'Shares' columns")
             return None
         
-        # Clean data
-        df = df.dropna(subset=['Symbol', 'Shares'])
-        df['Symbol'] = df['Symbol'].str.upper().str.strip()
-        df['Shares'] = pd.to_numeric(df['Shares'], errors='coerce')
-        df = df.dropna(subset=['Shares'])
+        # Clean data: normalize symbols, coerce shares to numbers, drop incomplete rows.
+        # Symbol is cast to string first: pyarrow infers a null (or numeric) type when
+        # the column has no text, e.g. a header-only file.
+        df = df.assign(
+            Symbol=df['Symbol'].astype(pd.ArrowDtype(pa.string())).str.upper().str.strip(),
+            Shares=pd.to_numeric(df['Shares'], errors='coerce', dtype_backend='pyarrow').astype('double[pyarrow]')
+        ).dropna(subset=['Symbol', 'Shares'])
         
         if len(df) == 0:
             st.error("❌ No valid data found after cleaning")
             return None
         
+        # Parse all option symbols in one vectorized pass; stock rows come back empty.
+        # The underlying ticker groups options with their stocks: the symbol itself for stocks.
+        parsed = df['Symbol'].str.extract(OPTION_SYMBOL_PATTERN)
+        df['Underlying Ticker'] = parsed['underlying'].fillna(df['Symbol'])
+        
+        # Store the repeated labels as categories: smaller, and grouped by integer codes
+        df = df.astype({'Symbol': 'category', 'Underlying Ticker': 'category'})
+        
         # Fetch current prices from Yahoo Finance
-        st.subheader("🔄 Fetching Current Prices...")
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        unique_symbols = df['Symbol'].unique()
+        results = fetch_prices(tuple(unique_symbols))
         
         prices = {}
         errors = []
-        
-        unique_symbols = df['Symbol'].unique()
-        for idx, symbol in enumerate(unique_symbols):
-            status_text.text(f"Fetching {symbol}...")
-            price, error = yahoo.fetch_price(symbol)
-            
+        for symbol, (price, error) in results.items():
             if price is not None:
                 prices[symbol] = price
             else:
                 errors.append(f"{symbol}: {error}")
-            
-            progress_bar.progress((idx + 1) / len(unique_symbols))
-        
-        progress_bar.empty()
-        status_text.empty()
         
-        if errors:
-            st.warning("⚠️ Some symbols could not be fetched:")
-            for error in errors:
-                st.text(f"  • {error}")
+        show_fetch_errors(errors)
         
         if prices:
-            # Calculate portfolio values
-            df['Current Price'] = df['Symbol'].map(prices)
-            df = df[df['Current Price'].notna()]
-            df['Current Value'] = df['Shares'] * df['Current Price']
-            
-            # Add underlying ticker column for grouping options with stocks
-            df['Underlying Ticker'] = df['Symbol'].apply(yahoo.get_underlying_ticker)
+            # Calculate portfolio values: look up one price per symbol category, gather
+            # them onto the rows by category code, and drop holdings without a price
+            category_prices = pd.Series(prices, dtype='float64').reindex(df['Symbol'].cat.categories).to_numpy()
+            current_prices = category_prices[df['Symbol'].cat.codes.to_numpy()]
+            has_price = ~np.isnan(current_prices)
+            df = df.loc[has_price].assign(**{'Current Price': current_prices[has_price]})
+            df['Current Value'] = df['Shares'].to_numpy(dtype='float64') * df['Current Price'].to_numpy()
             
             # Calculate total portfolio value
             total_value = df['Current Value'].sum()
             
             # Calculate percentage for each investment
-            df['Percentage'] = (df['Current Value'] / total_value * 100).round(2)
+            df['Percentage'] = (df['Current Value'] / total_value * 100).astype('float32')
+            
+            # Aggregate per underlying ticker once; reused by the chart and the AI summary.
+            # With one holding per underlying (e.g. stocks only) the rows already are the totals.
+            if df['Underlying Ticker'].is_unique:
+                by_underlying = df.set_index('Underlying Ticker')[['Current Value', 'Shares']]
+            else:
+                by_underlying = df.groupby('Underlying Ticker', sort=False, observed=True)[['Current Value', 'Shares']].sum()
             
             # Store in session state
+            total_investments = len(df)
             st.session_state.portfolio_data = {
                 'df': df,
+                'by_underlying': by_underlying,
                 'total_value': total_value,
+                # Serialized once with the prices shown on screen, for the download button
+                'csv_bytes': df.to_csv(index=False).encode(),
+                'errors': errors,
                 'summary_stats': {
-                    'total_investments': len(df),
-                    'average_holding': total_value / len(df) if len(df) > 0 else 0
+                    'total_investments': total_investments,
+                    'average_holding': total_value / total_investments if total_investments > 0 else 0
                 }
             }
+            st.session_state.last_file_hash = file_hash
+            # Invalidate the AI summary text built from the previous portfolio
+            st.session_state.portfolio_summary_text = None
             
             return st.session_state.portfolio_data
         else:
@@ -122,81 +214,107 @@ def display_portfolio_analysis(portfolio_data):
     """Display portfolio analysis visualization."""
     df = portfolio_data['df']
     total_value = portfolio_data['total_value']
+    summary_stats = portfolio_data['summary_stats']
     
     # Display portfolio summary
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Investments", len(df))
+        st.metric("Total Investments", summary_stats['total_investments'])
     with col2:
         st.metric("Total Portfolio Value", f"${total_value:,.2f}")
     with col3:
-        st.metric("Average Holding", f"${(total_value / len(df)):,.2f}")
+        st.metric("Average Holding", f"${summary_stats['average_holding']:,.2f}")
     
-    # Create pie chart
+    # Create distribution chart
     st.subheader("📈 Portfolio Distribution")
     
-    # Prepare data for pie chart - group by underlying ticker
-    pie_data = df.groupby('Underlying Ticker').agg({
-        'Current Value': 'sum'
-    }).reset_index()
-    pie_data = pie_data.rename(columns={'Underlying Ticker': 'Symbol'})
-    # Recalculate percentages after grouping
-    pie_data['Percentage'] = (pie_data['Current Value'] / total_value * 100).round(2)
-    pie_data = pie_data.sort_values('Current Value', ascending=False)
-    
-    # Create pie chart using Plotly
-    fig = px.pie(
-        pie_data,
-        values='Current Value',
-        names='Symbol',
-        title='Portfolio Distribution by Investment',
-        hover_data=['Percentage'],
-        labels={'Percentage': 'Percentage (%)'}
-    )
+    # Prepare data for pie chart from the per-underlying totals, largest first
+    ticker_values = portfolio_data['by_underlying']['Current Value']
+    order = np.argsort(-ticker_values.to_numpy(), kind='stable')
+    pie_data = pd.DataFrame({
+        'Symbol': ticker_values.index.to_numpy()[order],
+        'Current Value': ticker_values.to_numpy()[order],
+        'Percentage': ticker_values.to_numpy()[order] * 100 / total_value
+    })
     
-    fig.update_traces(
-        textposition='inside',
-        textinfo='percent+label',
-        hovertemplate='<b>%{label}</b><br>' +
-                    'Value: $%{value:,.2f}<br>' +
-                    'Percentage: %{customdata[0]:.2f}%<br>' +
-                    '<extra></extra>'
-    )
+    # Small portfolios default to a lightweight bar chart; the Plotly pie is opt-in
+    show_pie = st.toggle("Show as pie chart", value=len(pie_data) >= BAR_CHART_MAX_SLICES)
     
-    fig.update_layout(
-        height=600,
-        showlegend=True,
-        legend=dict(
-            orientation="v",
-            yanchor="middle",
-            y=0.5,
-            xanchor="left",
-            x=1.05
+    if show_pie:
+        # Imported lazily so pages without a pie chart do not pay for loading plotly
+        import plotly.express as px
+        
+        # Create pie chart using Plotly
+        fig = px.pie(
+            pie_data,
+            values='Current Value',
+            names='Symbol',
+            title='Portfolio Distribution by Investment',
+            hover_data=['Percentage'],
+            labels={'Percentage': 'Percentage (%)'}
         )
-    )
-    
-    st.plotly_chart(fig, use_container_width=True)
+        
+        fig.update_traces(
+            textposition='inside',
+            textinfo='percent+label',
+            hovertemplate='<b>%{label}</b><br>' +
+                        'Value: $%{value:,.2f}<br>' +
+                        'Percentage: %{customdata[0]:.2f}%<br>' +
+                        '<extra></extra>'
+        )
+        
+        fig.update_layout(
+            height=600,
+            showlegend=True,
+            legend=dict(
+                orientation="v",
+                yanchor="middle",
+                y=0.5,
+                xanchor="left",
+                x=1.05
+            )
+        )
+        
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.bar_chart(pie_data.set_index('Symbol')['Current Value'], horizontal=True)
     
     # Display detailed breakdown
     st.subheader("📊 Detailed Portfolio Breakdown")
     display_df = df[['Symbol', 'Shares', 'Current Price', 'Current Value', 'Percentage']].copy()
     display_df.columns = ['Symbol', 'Shares', 'Current Price ($)', 'Current Value ($)', 'Percentage (%)']
     display_df = display_df.sort_values('Current Value ($)', ascending=False)
-    display_df['Current Price ($)'] = display_df['Current Price ($)'].apply(lambda x: f"${x:.2f}")
-    display_df['Current Value ($)'] = display_df['Current Value ($)'].apply(lambda x: f"${x:,.2f}")
-    display_df['Percentage (%)'] = display_df['Percentage (%)'].apply(lambda x: f"{x:.2f}%")
     
-    st.dataframe(display_df, use_container_width=True, hide_index=True)
+    # Format at render time so the columns stay numeric (and sort numerically).
+    # st.dataframe shows the Styler's display value for every cell, so each column
+    # needs a format; otherwise Styler's default 6-digit precision is shown.
+    styler = display_df.style.format({
+        'Shares': '{:,.10g}',
+        'Current Price ($)': '${:,.2f}',
+        'Current Value ($)': '${:,.2f}',
+        'Percentage (%)': '{:.2f}%'
+    })
+    st.dataframe(styler, use_container_width=True, hide_index=True)
     
     # Download option
-    csv = df.to_csv(index=False)
     st.download_button(
         label="📥 Download Analyzed Portfolio (CSV)",
-        data=csv,
+        data=portfolio_data['csv_bytes'],
         file_name=f"portfolio_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
         mime="text/csv"
     )
 
+def render_chat_message(message):
+    """Render a single chat history entry."""
+    if message['role'] == 'user':
+        with st.chat_message("user"):
+            st.write(message['content'])
+    elif message['role'] == 'assistant':
+        with st.chat_message("assistant"):
+            st.write(message['content'])
+            if message.get('type') == 'quick_analysis':
+                st.caption("Quick Portfolio Analysis")
+
 def display_ai_analysis():
     """Display AI analysis screen with chat interface."""
     st.subheader("🤖 AI Portfolio Analysis")
@@ -206,7 +324,7 @@ def display_ai_analysis():
         return
     
     # Initialize AI analyzer
-    ai_analyzer = PortfolioAIAnalyzer()
+    ai_analyzer = get_ai()
     
     # Check if API key is configured
     if not ai_analyzer.client:
@@ -223,62 +341,65 @@ def display_ai_analysis():
         """)
         return
     
+    # Format the portfolio summary once per portfolio, not on every chat turn
+    if st.session_state.portfolio_summary_text is None:
+        st.session_state.portfolio_summary_text = ai_analyzer.format_portfolio_summary(st.session_state.portfolio_data)
+    portfolio_summary = st.session_state.portfolio_summary_text
+    
     # Display portfolio summary
     with st.expander("📋 View Portfolio Summary", expanded=False):
-        portfolio_summary = ai_analyzer.format_portfolio_summary(st.session_state.portfolio_data)
         st.text(portfolio_summary)
     
     # Quick analysis button
-    if st.button("🔍 Get Quick Portfolio Analysis", type="primary"):
-        with st.spinner("Analyzing portfolio..."):
-            portfolio_summary = ai_analyzer.format_portfolio_summary(st.session_state.portfolio_data)
-            analysis = ai_analyzer.analyze_portfolio(portfolio_summary)
-            
-            # Add to chat history
-            st.session_state.chat_history.append({
-                'role': 'assistant',
-                'content': analysis,
-                'type': 'quick_analysis'
-            })
-            st.rerun()
+    quick_analysis_requested = st.button("🔍 Get Quick Portfolio Analysis", type="primary")
     
     # Chat interface
     st.markdown("---")
     st.subheader("💬 Ask Questions About Your Portfolio")
     
-    # Display chat history
-    for i, message in enumerate(st.session_state.chat_history):
-        if message['role'] == 'user':
-            with st.chat_message("user"):
-                st.write(message['content'])
-        elif message['role'] == 'assistant':
+    # Display chat history; created before the chat input so new messages land above it
+    history = st.container()
+    with history:
+        for message in st.session_state.chat_history:
+            render_chat_message(message)
+    
+    if quick_analysis_requested:
+        # Stream the analysis at the end of the history as it is generated
+        with history:
             with st.chat_message("assistant"):
-                st.write(message['content'])
-                if message.get('type') == 'quick_analysis':
-                    st.caption("Quick Portfolio Analysis")
+                analysis = st.write_stream(ai_analyzer.analyze_portfolio(portfolio_summary, stream=True))
+                st.caption("Quick Portfolio Analysis")
+        
+        # Add to chat history
+        st.session_state.chat_history.append({
+            'role': 'assistant',
+            'content': analysis.strip() if isinstance(analysis, str) else analysis,
+            'type': 'quick_analysis'
+        })
     
     # Chat input
     user_question = st.chat_input("Ask a question about your portfolio...")
     
     if user_question:
-        # Add user question to chat history
-        st.session_state.chat_history.append({
+        # Add user question to chat history and render just the new messages into the
+        # history container, rather than rerunning the script to replay the whole history
+        question_message = {
             'role': 'user',
             'content': user_question
-        })
-        
-        # Get AI response
-        with st.spinner("Thinking..."):
-            portfolio_summary = ai_analyzer.format_portfolio_summary(st.session_state.portfolio_data)
-            response = ai_analyzer.ask_question(portfolio_summary, user_question)
+        }
+        st.session_state.chat_history.append(question_message)
+        with history:
+            render_chat_message(question_message)
             
-            # Add to chat history
-            st.session_state.chat_history.append({
-                'role': 'assistant',
-                'content': response
-            })
+            # Stream the AI response into a new assistant message
+            with st.chat_message("assistant"):
+                response = st.write_stream(ai_analyzer.ask_question(portfolio_summary, user_question, stream=True))
         
-        st.rerun()
+        # Add to chat history
+        st.session_state.chat_history.append({
+            'role': 'assistant',
+            'content': response.strip() if isinstance(response, str) else response
+        })
     
     # Clear chat button
     if st.session_state.chat_history:
@@ -289,7 +410,7 @@ def display_ai_analysis():
 # Main app logic
 if uploaded_file is not None:
     # Process portfolio if not already done or if file changed
-    portfolio_data = process_portfolio(uploaded_file)
+    portfolio_data = process_portfolio(uploaded_file.getvalue())
     
     if portfolio_data:
         # Create tabs
@@ -297,7 +418,11 @@ if uploaded_file is not None:
         
         with tab1:
             st.subheader("📋 Portfolio Data")
-            st.dataframe(portfolio_data['df'], use_container_width=True)
+            st.dataframe(
+                portfolio_data['df'],
+                use_container_width=True,
+                column_config={'Percentage': st.column_config.NumberColumn(format="%.2f%%")}
+            )
             display_portfolio_analysis(portfolio_data)
         
         with tab2:
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Default cache directory in the project root
+DEFAULT_CACHE_DIR = Path(__file__).parent / '.cache'
+
+# Minimum seconds between automatic sweeps for expired cache files
+PRUNE_INTERVAL = 10 * 60
+
+
+class FileCache:
+    """Small file-backed cache with per-lookup time-to-live.
+    
+    Each key is stored in its own file, named by the md5 hash of the key. JSON
+    values are stored as {"ts": epoch_seconds, "data": value}; DataFrames are
+    stored as parquet and aged by file modification time.
+    """
+    
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_age=None):
+        """Initialize the FileCache.
+        
+        Args:
+            cache_dir: Directory to store cache files in; created if missing
+            max_age: Optional age in seconds past which files are deleted; swept
+                at most every PRUNE_INTERVAL seconds as new entries are written
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_age = max_age
+        self._last_prune = 0.0
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            # e.g. a read-only deploy; every lookup is then a miss and writes are skipped
+            pass
+    
+    def get(self, key, ttl):
+        """Return the cached JSON value for key.
+        
+        Args:
+            key: Cache key string
+            ttl: Maximum age in seconds
+        
+        Returns:
+            The cached value, or None if missing, expired, or unreadable
+        """
+        entry = self.get_entry(key, ttl)
+        return None if entry is None else entry[1]
+    
+    def get_entry(self, key, ttl):
+        """Return the cached JSON value for key together with the time it was stored.
+        
+        Args:
+            key: Cache key string
+            ttl: Maximum age in seconds
+        
+        Returns:
+            tuple: (epoch_seconds, value), or None if missing, expired, or unreadable
+        """
+        try:
+            with open(self._path(key, '.json'), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        ts = entry.get('ts', 0)
+        if time.time() - ts > ttl:
+            return None
+        return ts, entry.get('data')
+    
+    def set(self, key, value):
+        """Store a JSON-serializable value under key.
+        
+        Args:
+            key: Cache key string
+            value: JSON-serializable value
+        """
+        self._write(self._path(key, '.json'), lambda f: f.write(json.dumps({'ts': time.time(), 'data': value}).encode()))
+    
+    def get_frame(self, key, ttl):
+        """Return the cached DataFrame for key.
+        
+        Args:
+            key: Cache key string
+            ttl: Maximum age in seconds
+        
+        Returns:
+            pd.DataFrame or None if missing, expired, or unreadable
+        """
+        entry = self.get_frame_entry(key, ttl)
+        return None if entry is None else entry[1]
+    
+    def get_frame_entry(self, key, ttl):
+        """Return the cached DataFrame for key together with the time it was stored.
+        
+        Args:
+            key: Cache key string
+            ttl: Maximum age in seconds
+        
+        Returns:
+            tuple: (epoch_seconds, pd.DataFrame), or None if missing, expired, or unreadable
+        """
+        path = self._path(key, '.parquet')
+        try:
+            mtime = path.stat().st_mtime
+            if time.time() - mtime > ttl:
+                return None
+            return mtime, pd.read_parquet(path)
+        except Exception:
+            return None
+    
+    def set_frame(self, key, df):
+        """Store a DataFrame under key as parquet.
+        
+        Args:
+            key: Cache key string
+            df: DataFrame to store
+        """
+        self._write(self._path(key, '.parquet'), lambda f: df.to_parquet(f))
+    
+    def prune(self, max_age):
+        """Delete cache files older than max_age seconds.
+        
+        Args:
+            max_age: Age in seconds past which no lookup can use a file
+        """
+        cutoff = time.time() - max_age
+        try:
+            paths = list(self.cache_dir.iterdir())
+        except OSError:
+            return
+        for path in paths:
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+    
+    def _maybe_prune(self):
+        """Prune expired files if max_age is set and the last sweep is old enough."""
+        now = time.time()
+        if self.max_age is None or now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        self.prune(self.max_age)
+    
+    def _path(self, key, suffix):
+        """Map a cache key to its file path."""
+        return self.cache_dir / (hashlib.md5(key.encode()).hexdigest() + suffix)
+    
+    def _write(self, path, write):
+        """Atomically write a cache file; failures only cost a cache miss."""
+        self._maybe_prune()
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    write(f)
+                os.replace(tmp_path, path)
+            except Exception:
+                os.remove(tmp_path)
+        except OSError:
+            pass
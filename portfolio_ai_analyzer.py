@@ -1,5 +1,5 @@
 from openai import OpenAI
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 import json
 import os
 from pathlib import Path
@@ -52,6 +52,8 @@ class PortfolioAIAnalyzer:
         Args:
             portfolio_df: Dictionary containing portfolio data including:
                 - df: DataFrame with portfolio holdings
+                - by_underlying: Optional precomputed 'Current Value' and 'Shares' totals
+                  indexed by underlying ticker
                 - total_value: Total portfolio value
                 - summary_stats: Dictionary with summary statistics
                 
@@ -62,54 +64,65 @@ class PortfolioAIAnalyzer:
         total_value = portfolio_df.get('total_value', 0)
         summary_stats = portfolio_df.get('summary_stats', {})
         
-        summary = f"""PORTFOLIO SUMMARY:
-Total Portfolio Value: ${total_value:,.2f}
-Total Number of Holdings: {len(df)}
-Average Holding Value: ${total_value / len(df) if len(df) > 0 else 0:,.2f}
-
-HOLDINGS DETAILS:
-"""
+        lines = [
+            "PORTFOLIO SUMMARY:\n",
+            f"Total Portfolio Value: ${total_value:,.2f}\n",
+            f"Total Number of Holdings: {len(df)}\n",
+            f"Average Holding Value: ${total_value / len(df) if len(df) > 0 else 0:,.2f}\n",
+            "\nHOLDINGS DETAILS:\n"
+        ]
         
         # Add each holding
-        for _, row in df.iterrows():
-            symbol = row.get('Symbol', 'N/A')
-            shares = row.get('Shares', 0)
-            current_price = row.get('Current Price', 0)
-            current_value = row.get('Current Value', 0)
-            percentage = row.get('Percentage', 0)
-            underlying_ticker = row.get('Underlying Ticker', symbol)
-            
-            summary += f"- {symbol}: {shares} shares @ ${current_price:.2f} = ${current_value:,.2f} ({percentage:.2f}%)\n"
+        lines.extend(
+            f"- {symbol}: {shares} shares @ ${current_price:.2f} = ${current_value:,.2f} ({percentage:.2f}%)\n"
+            for symbol, shares, current_price, current_value, percentage in zip(
+                df['Symbol'].to_numpy(),
+                df['Shares'].to_numpy(),
+                df['Current Price'].to_numpy(),
+                df['Current Value'].to_numpy(),
+                df['Percentage'].to_numpy()
+            )
+        )
         
         # Add grouped by underlying ticker if available
         if 'Underlying Ticker' in df.columns:
-            summary += "\nGROUPED BY UNDERLYING TICKER:\n"
-            grouped = df.groupby('Underlying Ticker').agg({
-                'Current Value': 'sum',
-                'Shares': 'sum'
-            }).reset_index()
+            grouped = portfolio_df.get('by_underlying')
+            if grouped is None:
+                grouped = df.groupby('Underlying Ticker', sort=False, observed=True)[['Current Value', 'Shares']].sum()
             
-            for _, row in grouped.iterrows():
-                ticker = row['Underlying Ticker']
-                value = row['Current Value']
-                total_shares = row['Shares']
-                pct = (value / total_value * 100) if total_value > 0 else 0
-                summary += f"- {ticker}: ${value:,.2f} ({pct:.2f}%) - {total_shares} total shares\n"
-        
-        return summary
+            # Skip the section when every holding is its own underlying; it would repeat the holdings
+            is_own_underlying = (
+                len(grouped) == len(df)
+                and (df['Underlying Ticker'].astype(str).to_numpy() == df['Symbol'].astype(str).to_numpy()).all()
+            )
+            if not is_own_underlying:
+                lines.append("\nGROUPED BY UNDERLYING TICKER:\n")
+                lines.extend(
+                    f"- {ticker}: ${value:,.2f} ({(value / total_value * 100) if total_value > 0 else 0:.2f}%) - {total_shares} total shares\n"
+                    for ticker, value, total_shares in zip(
+                        grouped.index.to_numpy(),
+                        grouped['Current Value'].to_numpy(),
+                        grouped['Shares'].to_numpy()
+                    )
+                )
+        
+        return "".join(lines)
     
-    def analyze_portfolio(self, portfolio_summary: str, question: Optional[str] = None) -> str:
+    def analyze_portfolio(self, portfolio_summary: str, question: Optional[str] = None,
+                          stream: bool = False) -> Union[str, Iterator[str]]:
         """Analyze portfolio using OpenAI API.
         
         Args:
             portfolio_summary: Formatted portfolio summary string
             question: Optional specific question to ask about the portfolio
+            stream: If True, return a generator yielding the response text as it arrives
             
         Returns:
-            str: AI analysis response
+            str: AI analysis response, or Iterator[str] of response chunks if stream is True
         """
         if not self.client:
-            return "Error: OpenAI API key not configured. Please set OPENAI_API_KEY in a .env file, environment variable, or Streamlit secrets."
+            error = "Error: OpenAI API key not configured. Please set OPENAI_API_KEY in a .env file, environment variable, or Streamlit secrets."
+            return iter([error]) if stream else error
         
         # Build the prompt
         system_prompt = """You are an expert stock analyst specializing in stock and options portfolio analysis, risk assessment, and investment strategy. 
@@ -140,33 +153,54 @@ Please provide a comprehensive analysis of this portfolio, including:
 3. Diversification assessment
 4. Recommendations for improvement"""
         
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        
+        if stream:
+            return self._stream_completion(messages)
+        
         try:
             # Use OpenAI ChatCompletion API
-            response = self.client.chat.completions.create(
-                model="gpt-5-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                reasoning_effort="minimal",  # Options: "minimal", "medium", "maximum"
-                verbosity="low",           # Options: "low", "medium", "high"
-                max_completion_tokens=2500
-            )
+            response = self._create_completion(messages)
             
             return response.choices[0].message.content.strip()
         
         except Exception as e:
             return f"Error calling OpenAI API: {str(e)}"
     
-    def ask_question(self, portfolio_summary: str, question: str) -> str:
+    def ask_question(self, portfolio_summary: str, question: str,
+                     stream: bool = False) -> Union[str, Iterator[str]]:
         """Ask a specific question about the portfolio.
         
         Args:
             portfolio_summary: Formatted portfolio summary string
             question: User's question about the portfolio
+            stream: If True, return a generator yielding the response text as it arrives
             
         Returns:
-            str: AI response to the question
+            str: AI response to the question, or Iterator[str] of response chunks if stream is True
         """
-        return self.analyze_portfolio(portfolio_summary, question)
+        return self.analyze_portfolio(portfolio_summary, question, stream=stream)
+    
+    def _create_completion(self, messages: List[Dict], stream: bool = False):
+        """Send the chat messages to the OpenAI ChatCompletion API."""
+        return self.client.chat.completions.create(
+            model="gpt-5-mini",
+            messages=messages,
+            reasoning_effort="minimal",  # Options: "minimal", "medium", "maximum"
+            verbosity="low",           # Options: "low", "medium", "high"
+            max_completion_tokens=2500,
+            stream=stream
+        )
+    
+    def _stream_completion(self, messages: List[Dict]) -> Iterator[str]:
+        """Yield the completion text chunk by chunk as the model generates it."""
+        try:
+            for chunk in self._create_completion(messages, stream=True):
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or ""
+        except Exception as e:
+            yield f"Error calling OpenAI API: {str(e)}"
 
@@ -1,7 +1,59 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+import time
+import numpy as np
 import yfinance as yf
 import pandas as pd
-from datetime import datetime
+from datetime import date, datetime
 import re
+import threading
+from cache import FileCache
+
+# Option symbol format: TICKER MM/DD/YYYY STRIKE C or P (named groups allow vectorized str.extract)
+OPTION_SYMBOL_PATTERN = (
+    r'^(?P<underlying>[A-Z]+)\s+(?P<expiration>\d{2}/\d{2}/\d{4})\s+'
+    r'(?P<strike>\d+\.?\d*)\s+(?P<option_type>[CP])$'
+)
+_OPTION_RE = re.compile(OPTION_SYMBOL_PATTERN)
+
+# Maximum number of price requests in flight at once, to stay within Yahoo rate limits
+MAX_CONCURRENT_REQUESTS = 20
+
+# Worker threads used by the synchronous (non-asyncio) batch fetch
+MAX_FETCH_WORKERS = 16
+
+# Seconds a fetched price stays fresh in the in-memory cache
+PRICE_CACHE_TTL = 300
+
+# Seconds a stock price / option chain stays fresh in the on-disk file cache
+STOCK_CACHE_TTL = 15 * 60
+OPTION_CHAIN_CACHE_TTL = 60 * 60
+
+# yf.download collects results in module globals, so only one may run at a time
+_DOWNLOAD_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=128)
+def _cached_ticker(symbol, time_bucket):
+    """Create a yf.Ticker; memoized per symbol and time bucket."""
+    return yf.Ticker(symbol)
+
+
+def _get_ticker(symbol):
+    """Return a shared yf.Ticker for symbol.
+    
+    Ticker objects memoize some responses (e.g. the expiration dates behind
+    Ticker.options), so each one is only reused for PRICE_CACHE_TTL seconds
+    before a fresh one is created.
+    """
+    return _cached_ticker(symbol, int(time.time() // PRICE_CACHE_TTL))
+
+
+@lru_cache(maxsize=128)
+def _list_expirations(symbol, day):
+    """Return the option expiration dates for symbol; memoized per calendar day."""
+    return tuple(_get_ticker(symbol).options)
 
 
 class YahooInterface:
@@ -9,7 +61,12 @@ class YahooInterface:
     
     def __init__(self):
         """Initialize the YahooInterface."""
-        pass
+        # In-memory cache in front of the file cache: symbol -> (fetch epoch seconds, price)
+        self._price_cache = {}
+        
+        # On-disk cache of prices and option chains that survives process restarts;
+        # files no lookup can use any more are swept out as new entries are written
+        self._file_cache = FileCache(max_age=max(STOCK_CACHE_TTL, OPTION_CHAIN_CACHE_TTL))
     
     def fetch_price(self, symbol):
         """Fetch price for either a stock or option symbol.
@@ -20,11 +77,151 @@ class YahooInterface:
         Returns:
             tuple: (price, error_message) where price is float or None, error_message is str or None
         """
+        price = self._get_cached_price(symbol)
+        if price is not None:
+            return price, None
+        
         # Check if it's an option
         if self._is_option_symbol(symbol):
             return self._fetch_option_price(symbol)
-        else:
-            return self._fetch_stock_price(symbol)
+        return self._fetch_stock_price(symbol)
+    
+    async def fetch_prices_async(self, symbols, on_result=None):
+        """Fetch prices for many symbols concurrently.
+        
+        Stocks are fetched together in one batched download; each option is
+        fetched separately. The blocking yfinance calls run in worker threads so
+        the network round-trips overlap; at most MAX_CONCURRENT_REQUESTS run at once.
+        
+        Args:
+            symbols: Iterable of stock tickers and/or option symbols
+            on_result: Optional callback invoked as on_result(symbol, price, error_message)
+                as each fetch completes, e.g. to update a progress bar
+                
+        Returns:
+            dict: Mapping of symbol to (price, error_message) tuples
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        
+        async def fetch_batch(fetch, batch):
+            async with semaphore:
+                return await asyncio.to_thread(fetch, batch)
+        
+        results = {}
+        symbols = self._emit_cached_prices(symbols, results, on_result)
+        tasks = [fetch_batch(fetch, batch) for fetch, batch in self._fetch_batches(symbols)]
+        for task in asyncio.as_completed(tasks):
+            for symbol, (price, error) in (await task).items():
+                results[symbol] = (price, error)
+                if on_result is not None:
+                    on_result(symbol, price, error)
+        
+        return results
+    
+    def fetch_prices(self, symbols, max_workers=MAX_FETCH_WORKERS):
+        """Fetch prices for many symbols on a thread pool, without asyncio.
+        
+        Fallback for callers that cannot start an event loop (e.g. one is
+        already running). Results are yielded in completion order, batch by batch.
+        
+        Args:
+            symbols: Iterable of stock tickers and/or option symbols
+            max_workers: Maximum number of concurrent fetches
+            
+        Yields:
+            tuple: (symbol, price, error_message) for each symbol
+        """
+        cached = {}
+        symbols = self._emit_cached_prices(symbols, cached)
+        for symbol, (price, error) in cached.items():
+            yield symbol, price, error
+        
+        batches = self._fetch_batches(symbols)
+        if not batches:
+            return
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            futures = [executor.submit(fetch, batch) for fetch, batch in batches]
+            for future in as_completed(futures):
+                for symbol, (price, error) in future.result().items():
+                    yield symbol, price, error
+    
+    def _get_cached_price(self, symbol):
+        """Return the in-memory cached price for symbol, or None if missing or expired."""
+        entry = self._price_cache.get(symbol)
+        if entry is not None and time.time() - entry[0] < PRICE_CACHE_TTL:
+            return entry[1]
+        return None
+    
+    def _cache_prices(self, results, fetched_at=None):
+        """Store successfully fetched prices in the in-memory cache.
+        
+        Args:
+            results: Mapping of symbol to (price, error_message) tuples
+            fetched_at: Optional mapping of symbol to the epoch time its price was
+                originally fetched, for prices served from the file cache; others
+                are stamped with the current time
+            
+        Returns:
+            dict: The results, unchanged
+        """
+        now = time.time()
+        fetched_at = fetched_at or {}
+        for symbol, (price, _) in results.items():
+            if price is not None:
+                self._price_cache[symbol] = (fetched_at.get(symbol, now), price)
+        return results
+    
+    def _emit_cached_prices(self, symbols, results, on_result=None):
+        """Fill results with cached prices and return the symbols still to fetch.
+        
+        Args:
+            symbols: Iterable of stock tickers and/or option symbols
+            results: Dict to add cached (price, None) entries to
+            on_result: Optional callback invoked as on_result(symbol, price, None) per cache hit
+            
+        Returns:
+            list: Symbols with no fresh cached price
+        """
+        missing = []
+        for symbol in symbols:
+            price = self._get_cached_price(symbol)
+            if price is None:
+                missing.append(symbol)
+                continue
+            results[symbol] = (price, None)
+            if on_result is not None:
+                on_result(symbol, price, None)
+        return missing
+    
+    def _fetch_batches(self, symbols):
+        """Split symbols into independent fetch jobs.
+        
+        Args:
+            symbols: Iterable of stock tickers and/or option symbols
+            
+        Returns:
+            list: (fetch_function, symbols) pairs; each function returns a dict of
+                symbol to (price, error_message)
+        """
+        stocks = []
+        options = []
+        for symbol in symbols:
+            if self._is_option_symbol(symbol):
+                options.append(symbol)
+            else:
+                stocks.append(symbol)
+        
+        # Legs sharing an underlying and expiration are priced from one option chain download
+        option_groups = {}
+        for symbol in options:
+            parsed = self._parse_option_symbol(symbol)
+            group_key = (parsed[0], parsed[1]) if parsed else symbol
+            option_groups.setdefault(group_key, []).append(symbol)
+        
+        batches = [(self._fetch_stock_prices, stocks)] if stocks else []
+        batches.extend((self._fetch_option_prices, group) for group in option_groups.values())
+        return batches
     
     def get_underlying_ticker(self, symbol):
         """Extract underlying ticker from symbol (for options) or return symbol itself (for stocks).
@@ -50,9 +247,7 @@ class YahooInterface:
         Returns:
             bool: True if symbol is in option format, False otherwise
         """
-        # Pattern: TICKER MM/DD/YYYY STRIKE C or P
-        pattern = r'^[A-Z]+\s+\d{2}/\d{2}/\d{4}\s+\d+\.?\d*\s+[CP]$'
-        return bool(re.match(pattern, symbol))
+        return _OPTION_RE.match(symbol) is not None
     
     def _parse_option_symbol(self, symbol):
         """Parse option symbol format: TICKER MM/DD/YYYY STRIKE C/P.
@@ -92,18 +287,121 @@ class YahooInterface:
         Returns:
             tuple: (price, error_message) where price is float or None, error_message is str or None
         """
+        cache_key = self._stock_cache_key(symbol)
+        cached = self._file_cache.get_entry(cache_key, STOCK_CACHE_TTL)
+        if cached is not None:
+            fetched_at, cached_price = cached
+            return self._cache_prices({symbol: (cached_price, None)}, {symbol: fetched_at})[symbol]
+        
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.history(period="1d")
+            ticker = _get_ticker(symbol)
+            # The latest close is the same adjusted or not, so skip the adjustment and
+            # dividend/split processing yfinance would otherwise do on the frame
+            info = ticker.history(period="1d", auto_adjust=False, actions=False)
             
             if not info.empty:
-                current_price = info['Close'].iloc[-1]
-                return current_price, None
+                current_price = float(info['Close'].iloc[-1])
+                self._file_cache.set(cache_key, current_price)
+                return self._cache_prices({symbol: (current_price, None)})[symbol]
             else:
                 return None, f"No data available for {symbol}"
         except Exception as e:
             return None, str(e)
     
+    def _fetch_stock_prices(self, symbols):
+        """Fetch prices for several stock symbols with a single batched download.
+        
+        Args:
+            symbols: List of stock ticker symbols
+            
+        Returns:
+            dict: Mapping of symbol to (price, error_message) tuples
+        """
+        results = {}
+        fetched_at = {}
+        to_download = []
+        for symbol in symbols:
+            cached = self._file_cache.get_entry(self._stock_cache_key(symbol), STOCK_CACHE_TTL)
+            if cached is not None:
+                fetched_at[symbol], price = cached
+                results[symbol] = (price, None)
+            else:
+                to_download.append(symbol)
+        if not to_download:
+            return self._cache_prices(results, fetched_at)
+        
+        try:
+            with _DOWNLOAD_LOCK:
+                data = yf.download(
+                    tickers=to_download,
+                    period="1d",
+                    group_by='ticker',
+                    auto_adjust=False,
+                    actions=False,
+                    threads=True,
+                    progress=False
+                )
+        except Exception as e:
+            results.update((symbol, (None, str(e))) for symbol in to_download)
+            return self._cache_prices(results, fetched_at)
+        
+        for symbol in to_download:
+            try:
+                # Columns are (ticker, field) pairs unless a single ticker was requested
+                if isinstance(data.columns, pd.MultiIndex):
+                    closes = data[symbol]['Close'].dropna()
+                else:
+                    closes = data['Close'].dropna()
+            except KeyError:
+                closes = None
+            
+            if closes is not None and not closes.empty:
+                price = float(closes.iloc[-1])
+                results[symbol] = (price, None)
+                self._file_cache.set(self._stock_cache_key(symbol), price)
+            else:
+                results[symbol] = (None, f"No data available for {symbol}")
+        return self._cache_prices(results, fetched_at)
+    
+    def _fetch_option_prices(self, symbols):
+        """Fetch prices for several option symbols, downloading each option chain once.
+        
+        Args:
+            symbols: List of option symbols in format 'TICKER MM/DD/YYYY STRIKE C/P'
+            
+        Returns:
+            dict: Mapping of symbol to (price, error_message) tuples
+        """
+        results = {}
+        fetched_at = {}
+        chains = {}
+        for symbol in symbols:
+            parsed = self._parse_option_symbol(symbol)
+            if parsed is None:
+                results[symbol] = (None, f"Invalid option format: {symbol}")
+                continue
+            
+            underlying, exp_date, strike, option_type = parsed
+            chain_key = (underlying, exp_date)
+            if chain_key not in chains:
+                try:
+                    chains[chain_key] = self._get_nearest_option_chain(underlying, exp_date)
+                except Exception as e:
+                    chains[chain_key] = e
+            chain = chains[chain_key]
+            
+            if isinstance(chain, Exception):
+                results[symbol] = (None, f"Error fetching option {symbol}: {str(chain)}")
+            elif chain is None:
+                results[symbol] = (None, f"No option data available for {underlying}")
+            else:
+                calls, puts, fetched_at[symbol] = chain
+                try:
+                    results[symbol] = self._price_option(symbol, calls if option_type == 'C' else puts, strike)
+                except Exception as e:
+                    results[symbol] = (None, f"Error fetching option {symbol}: {str(e)}")
+        return self._cache_prices(results, fetched_at)
+    
     def _fetch_option_price(self, symbol):
         """Fetch price for an option symbol.
         
@@ -113,79 +411,119 @@ class YahooInterface:
         Returns:
             tuple: (price, error_message) where price is float or None, error_message is str or None
         """
-        parsed = self._parse_option_symbol(symbol)
-        if parsed is None:
-            return None, f"Invalid option format: {symbol}"
+        return self._fetch_option_prices([symbol])[symbol]
+    
+    def _get_nearest_option_chain(self, underlying, exp_date):
+        """Get the option chain for an expiration date, or the closest available one.
         
-        underlying, exp_date, strike, option_type = parsed
+        Args:
+            underlying: Underlying ticker symbol
+            exp_date: Requested expiration datetime
+            
+        Returns:
+            tuple: (calls, puts, fetched_at) with the chain DataFrames and the epoch time
+                they were fetched, or None if the underlying has no options
+        """
+        # Format expiration date as YYYY-MM-DD
+        exp_date_str = exp_date.strftime('%Y-%m-%d')
         
+        # Get option chain for the expiration date
         try:
-            # Get the underlying ticker
-            ticker = yf.Ticker(underlying)
+            return self._get_option_chain(underlying, exp_date_str)
+        except Exception:
+            # If exact date fails, try to get the nearest expiration
+            expirations = self._get_expirations(underlying)
+            if not expirations:
+                return None
             
-            # Format expiration date as YYYY-MM-DD
-            exp_date_str = exp_date.strftime('%Y-%m-%d')
+            # Find the closest expiration date
+            exp_dates = np.array(expirations, dtype='datetime64[D]')
+            target = np.datetime64(exp_date.date())
+            closest_exp = expirations[int(np.abs(exp_dates - target).argmin())]
             
-            # Get option chain for the expiration date
-            try:
-                opt_chain = ticker.option_chain(exp_date_str)
-            except Exception:
-                # If exact date fails, try to get the nearest expiration
-                expirations = ticker.options
-                if not expirations:
-                    return None, f"No option data available for {underlying}"
-                
-                # Find the closest expiration date
-                exp_date_only = exp_date.date()
-                closest_exp = None
-                min_diff = None
-                
-                for exp in expirations:
-                    exp_dt = datetime.strptime(exp, '%Y-%m-%d').date()
-                    diff = abs((exp_dt - exp_date_only).days)
-                    if min_diff is None or diff < min_diff:
-                        min_diff = diff
-                        closest_exp = exp
-                
-                if closest_exp:
-                    opt_chain = ticker.option_chain(closest_exp)
-                else:
-                    return None, f"Could not find option expiration date for {symbol}"
+            return self._get_option_chain(underlying, closest_exp)
+    
+    def _price_option(self, symbol, options_df, strike):
+        """Price one option contract from its calls or puts chain.
+        
+        Args:
+            symbol: Option symbol, used in error messages
+            options_df: Calls or puts DataFrame for the option's expiration
+            strike: Strike price
             
-            # Get calls or puts
-            if option_type == 'C':
-                options_df = opt_chain.calls
+        Returns:
+            tuple: (price, error_message) where price is float or None, error_message is str or None
+        """
+        # Find the option with matching strike price (with small tolerance for rounding).
+        # Yahoo returns chains sorted by strike, so binary search and check the neighbours.
+        strikes = options_df['strike'].to_numpy()
+        i = int(np.searchsorted(strikes, strike))
+        matches = [j for j in (i - 1, i) if 0 <= j < len(strikes) and abs(strikes[j] - strike) < 0.01]
+        
+        if not matches:
+            return None, f"Option {symbol} not found (strike {strike} may not exist)"
+        
+        # Get the last price (or bid/ask midpoint if lastPrice is NaN)
+        option_row = options_df.iloc[matches[0]]
+        price = option_row.get('lastPrice')
+        
+        # If lastPrice is NaN, use bid/ask midpoint
+        if pd.isna(price) or price == 0:
+            bid = option_row.get('bid', 0)
+            ask = option_row.get('ask', 0)
+            if bid > 0 and ask > 0:
+                price = (bid + ask) / 2
+            elif bid > 0:
+                price = bid
+            elif ask > 0:
+                price = ask
             else:
-                options_df = opt_chain.puts
-            
-            # Find the option with matching strike price (with small tolerance for rounding)
-            matching_options = options_df[abs(options_df['strike'] - strike) < 0.01]
-            
-            if matching_options.empty:
-                return None, f"Option {symbol} not found (strike {strike} may not exist)"
-            
-            # Get the last price (or bid/ask midpoint if lastPrice is NaN)
-            option_row = matching_options.iloc[0]
-            price = option_row.get('lastPrice')
-            
-            # If lastPrice is NaN, use bid/ask midpoint
-            if pd.isna(price) or price == 0:
-                bid = option_row.get('bid', 0)
-                ask = option_row.get('ask', 0)
-                if bid > 0 and ask > 0:
-                    price = (bid + ask) / 2
-                elif bid > 0:
-                    price = bid
-                elif ask > 0:
-                    price = ask
-                else:
-                    return None, f"Option {symbol} has no price data available"
-            
-            # Options contracts represent 100 shares, so multiply price by 100
-            price = float(price) * 100
+                return None, f"Option {symbol} has no price data available"
+        
+        # Options contracts represent 100 shares, so multiply price by 100
+        price = float(price) * 100
+        
+        return price, None
+    
+    def _stock_cache_key(self, symbol):
+        """File cache key for the latest price of a stock symbol."""
+        return f"stock:{symbol}"
+    
+    def _get_option_chain(self, underlying, exp_date_str):
+        """Get the calls and puts for one expiration, using the file cache when fresh.
+        
+        Args:
+            underlying: Underlying ticker symbol
+            exp_date_str: Expiration date as YYYY-MM-DD
             
-            return price, None
+        Returns:
+            tuple: (calls, puts, fetched_at) with the chain DataFrames and the epoch time
+                they were fetched
+        """
+        key = f"optchain:{underlying}:{exp_date_str}"
+        calls = self._file_cache.get_frame_entry(f"{key}:calls", OPTION_CHAIN_CACHE_TTL)
+        puts = self._file_cache.get_frame_entry(f"{key}:puts", OPTION_CHAIN_CACHE_TTL)
+        if calls is not None and puts is not None:
+            return calls[1], puts[1], min(calls[0], puts[0])
+        
+        fetched_at = time.time()
+        opt_chain = _get_ticker(underlying).option_chain(exp_date_str)
+        self._file_cache.set_frame(f"{key}:calls", opt_chain.calls)
+        self._file_cache.set_frame(f"{key}:puts", opt_chain.puts)
+        return opt_chain.calls, opt_chain.puts, fetched_at
+    
+    def _get_expirations(self, underlying):
+        """Get the available option expiration dates, using the file cache when fresh.
+        
+        Args:
+            underlying: Underlying ticker symbol
             
-        except Exception as e:
-            return None, f"Error fetching option {symbol}: {str(e)}"
-
+        Returns:
+            list: Expiration dates as YYYY-MM-DD strings
+        """
+        key = f"expirations:{underlying}"
+        expirations = self._file_cache.get(key, OPTION_CHAIN_CACHE_TTL)
+        if expirations is None:
+            expirations = list(_list_expirations(underlying, date.today().isoformat()))
+            self._file_cache.set(key, expirations)
+        return expirations